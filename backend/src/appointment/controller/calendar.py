@@ -5,9 +5,12 @@ Handle connection to a CalDAV server.
 
 import json
 import logging
+import threading
 import time
 import zoneinfo
 import os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 import caldav.lib.error
 import requests
@@ -15,6 +18,7 @@ import sentry_sdk
 from redis import Redis, RedisCluster
 from caldav import DAVClient
 from fastapi import BackgroundTasks
+from requests.adapters import HTTPAdapter
 from google.oauth2.credentials import Credentials
 from icalendar import Calendar, Event, vCalAddress, vText
 from datetime import datetime, timedelta, timezone, UTC
@@ -29,6 +33,72 @@ from ..exceptions.validation import RemoteCalendarConnectionError
 from ..l10n import l10n
 from ..tasks.emails import send_invite_email
 
+# Process-wide CalDAV clients keyed by (url, user), so we don't re-connect and re-discover the principal per request.
+# The client is stored alongside the password it was created with, so credential changes create a fresh client.
+# The pool is kept in least recently used order and bounded, the clients that fall out of it are closed.
+# Replaced or evicted clients aren't closed as another request may still be using them, their sessions close on gc.
+_caldav_clients: OrderedDict[tuple[str, str], tuple[str, DAVClient]] = OrderedDict()
+# Discovered remote calendars per pooled client with the time they were listed, they rarely change.
+_caldav_calendar_lists: dict[tuple[str, str], tuple[float, list[schemas.CalendarConnectionOut]]] = {}
+# Pooled clients whose server rejected a free-busy query, so we don't send them another one.
+_caldav_freebusy_unsupported: set[tuple[str, str]] = set()
+_caldav_lock = threading.Lock()
+
+
+def get_caldav_client(
+    url: str, user: str, password: str, max_clients=os.getenv('CALDAV_CLIENT_POOL_SIZE', 256)
+) -> DAVClient:
+    """Retrieve the pooled CalDAV client for a given url and user, or create one if there's none yet."""
+    key = (url, user)
+    dropped = []
+    with _caldav_lock:
+        pooled = _caldav_clients.get(key)
+        if pooled is not None and pooled[0] == password:
+            _caldav_clients.move_to_end(key)
+            return pooled[1]
+
+        client = DAVClient(url=url, username=user, password=password)
+        # The client is shared between requests (and threads), so give its keep-alive session a larger pool
+        adapter = HTTPAdapter(pool_connections=10, pool_maxsize=20, max_retries=1)
+        client.session.mount('https://', adapter)
+        client.session.mount('http://', adapter)
+        _caldav_clients[key] = (password, client)
+        _caldav_clients.move_to_end(key)
+        _caldav_calendar_lists.pop(key, None)
+        _caldav_freebusy_unsupported.discard(key)
+
+        # Drop the least recently used clients (and their calendar lists) if we're over the limit
+        while len(_caldav_clients) > int(max_clients):
+            dropped_key, (_, dropped_client) = _caldav_clients.popitem(last=False)
+            _caldav_calendar_lists.pop(dropped_key, None)
+            _caldav_freebusy_unsupported.discard(dropped_key)
+            dropped.append(dropped_client)
+
+    for dropped_client in dropped:
+        dropped_client.close()
+
+    return client
+
+
+def evict_caldav_client(url: str, user: str):
+    """Remove a pooled CalDAV client, the next request for this url and user will create a new connection"""
+    with _caldav_lock:
+        _caldav_clients.pop((url, user), None)
+        _caldav_calendar_lists.pop((url, user), None)
+        _caldav_freebusy_unsupported.discard((url, user))
+
+
+def close_caldav_clients():
+    """Close all pooled CalDAV client sessions, used on app shutdown"""
+    with _caldav_lock:
+        pooled = list(_caldav_clients.values())
+        _caldav_clients.clear()
+        _caldav_calendar_lists.clear()
+        _caldav_freebusy_unsupported.clear()
+
+    for _, client in pooled:
+        client.close()
+
 
 class BaseConnector:
     redis_instance: Redis | RedisCluster | None
@@ -169,8 +239,8 @@ class GoogleConnector(BaseConnector):
         if cached_events:
             return cached_events
 
-        time_min = datetime.strptime(start, DATEFMT).isoformat() + 'Z'
-        time_max = datetime.strptime(end, DATEFMT).isoformat() + 'Z'
+        time_min = utils.parse_date(start).isoformat() + 'Z'
+        time_max = utils.parse_date(end).isoformat() + 'Z'
 
         # We're storing google cal id in user...for now.
         remote_events = self.google_client.list_events(self.remote_calendar_id, time_min, time_max, self.google_token)
@@ -197,12 +267,12 @@ class GoogleConnector(BaseConnector):
             all_day = 'date' in event.get('start')
 
             start = (
-                datetime.strptime(event.get('start')['date'], DATEFMT)
+                utils.parse_date(event.get('start')['date'])
                 if all_day
                 else datetime.fromisoformat(event.get('start')['dateTime'])
             )
             end = (
-                datetime.strptime(event.get('end')['date'], DATEFMT)
+                utils.parse_date(event.get('end')['date'])
                 if all_day
                 else datetime.fromisoformat(event.get('end')['dateTime'])
             )
@@ -222,6 +292,12 @@ class GoogleConnector(BaseConnector):
 
         return events
 
+    def list_freebusy(self, start, end):
+        """find all busy periods in given date range on the remote server
+        Google's event list is already filtered down to time blocking events, so this matches list_events.
+        """
+        return self.list_events(start, end)
+
     def create_event(
         self,
         event: schemas.Event,
@@ -278,8 +354,13 @@ class CalDavConnector(BaseConnector):
         self.password = password
         self.user = user
 
-        # connect to the CalDAV server
-        self.client = DAVClient(url=url, username=user, password=password)
+        # grab a (possibly already connected) client for the CalDAV server, pooled by the normalised url
+        self.client_key = (self.url, user)
+        self.client = get_caldav_client(self.url, user, password)
+
+    def reset_client(self):
+        """Drop our pooled client, so the next connector for this server reconnects"""
+        evict_caldav_client(*self.client_key)
 
     def test_connection(self) -> bool:
         """Ensure the connection information is correct and the calendar connection works"""
@@ -289,27 +370,48 @@ class CalDavConnector(BaseConnector):
             supported_comps = cal.get_supported_components()
         except IndexError as ex:  # Library has an issue with top level urls, probably due to caldav spec?
             logging.error(f'Error testing connection {ex}')
+            self.reset_client()
             return False
         except KeyError as ex:
             logging.error(f'Error testing connection {ex}')
+            self.reset_client()
             return False
         except requests.exceptions.RequestException:  # Max retries exceeded, bad connection, missing schema, etc...
+            self.reset_client()
             return False
         except caldav.lib.error.NotFoundError:  # Good server, bad url.
+            self.reset_client()
             return False
 
         # They need at least VEVENT support for appointment to work.
         return 'VEVENT' in supported_comps
 
     def sync_calendars(self):
-        # We don't sync anything for caldav, but might as well bust event cache.
+        # We don't sync anything for caldav, but might as well bust event cache and re-discover the calendars.
+        with _caldav_lock:
+            _caldav_calendar_lists.pop(self.client_key, None)
         self.bust_cached_events(all_calendars=True)
 
-    def list_calendars(self):
-        """find all calendars on the remote server"""
+    def list_calendars(self, expiry=os.getenv('CALDAV_CALENDAR_LIST_EXPIRE_SECONDS', 60)):
+        """find all calendars on the remote server
+        The list is kept with our pooled client for a short while, as discovering it takes a couple of requests."""
+        with _caldav_lock:
+            listed = _caldav_calendar_lists.get(self.client_key)
+            # The list belongs to the pooled client, which may have been replaced by one with other credentials
+            if _caldav_clients.get(self.client_key, (None, None))[1] is not self.client:
+                listed = None
+        if listed is not None and time.monotonic() - listed[0] < int(expiry):
+            return list(listed[1])
+
         calendars = []
-        principal = self.client.principal()
-        for c in principal.calendars():
+        try:
+            # The client caches the discovered principal, which our pooled client keeps between requests
+            remote_calendars = self.client.principal().calendars()
+        except (caldav.lib.error.DAVError, requests.exceptions.RequestException):
+            self.reset_client()
+            raise
+
+        for c in remote_calendars:
             calendars.append(
                 schemas.CalendarConnectionOut(
                     title=c.name,
@@ -317,6 +419,12 @@ class CalDavConnector(BaseConnector):
                     user=self.user,
                 )
             )
+
+        with _caldav_lock:
+            # Only hold on to the list if our client is still the pooled one (e.g. it wasn't replaced meanwhile)
+            if _caldav_clients.get(self.client_key, (None, None))[1] is self.client:
+                _caldav_calendar_lists[self.client_key] = (time.monotonic(), list(calendars))
+
         return calendars
 
     def list_events(self, start, end):
@@ -328,15 +436,22 @@ class CalDavConnector(BaseConnector):
 
         events = []
         calendar = self.client.calendar(url=self.url)
-        result = calendar.search(
-            start=datetime.strptime(start, DATEFMT),
-            end=datetime.strptime(end, DATEFMT),
-            event=True,
-            expand=True,
-        )
+        try:
+            result = calendar.search(
+                start=utils.parse_date(start),
+                end=utils.parse_date(end),
+                event=True,
+                expand=True,
+            )
+        except (caldav.lib.error.DAVError, requests.exceptions.RequestException):
+            self.reset_client()
+            raise
+
         for e in result:
-            transparency = e.icalendar_component['transp'].lower() if 'transp' in e.icalendar_component else 'opaque'
-            status = e.icalendar_component['status'].lower() if 'status' in e.icalendar_component else ''
+            # Stick to the icalendar component, touching vobject_instance would re-parse the whole event
+            component = e.icalendar_component
+            transparency = component.get('transp', 'opaque').lower()
+            status = component.get('status', '').lower()
 
             # Ignore cancelled events
             if status == 'cancelled' or transparency == 'transparent':
@@ -345,8 +460,8 @@ class CalDavConnector(BaseConnector):
             # Mark tentative events
             tentative = status == 'tentative'
 
-            title = e.vobject_instance.vevent.summary.value
-            start = e.vobject_instance.vevent.dtstart.value
+            title = str(component.get('summary', ''))
+            start = component['dtstart'].dt
             # get_duration grabs either end or duration into a timedelta
             end = start + e.get_duration()
             # if start doesn't hold time information (no datetime), it's a whole day
@@ -359,7 +474,7 @@ class CalDavConnector(BaseConnector):
                     end=end,
                     all_day=all_day,
                     tentative=tentative,
-                    description=e.icalendar_component['description'] if 'description' in e.icalendar_component else '',
+                    description=str(component.get('description', '')),
                 )
             )
 
@@ -367,40 +482,123 @@ class CalDavConnector(BaseConnector):
 
         return events
 
+    def list_freebusy(self, start, end):
+        """find all busy periods in given date range on the remote server
+        This only transfers busy times, falls back to list_events if the server doesn't support free-busy queries.
+        """
+        with _caldav_lock:
+            unsupported = self.client_key in _caldav_freebusy_unsupported
+        if unsupported:
+            return self.list_events(start, end)
+
+        cache_scope = f'freebusy_{start}_{end}'
+        cached_events = self.get_cached_events(cache_scope)
+        if cached_events:
+            return cached_events
+
+        calendar = self.client.calendar(url=self.url)
+        try:
+            freebusy = calendar.freebusy_request(utils.parse_date(start), utils.parse_date(end))
+            components = freebusy.icalendar_instance.walk('VFREEBUSY')
+        except requests.exceptions.RequestException:
+            self.reset_client()
+            raise
+        except (caldav.lib.error.DAVError, ValueError, AttributeError):
+            # The server rejected the query (e.g. a 403, 404 or report error) or didn't answer with an iCalendar
+            return self.list_events_instead_of_freebusy(start, end)
+
+        events = []
+        for component in components:
+            periods = component.get('freebusy', [])
+            # A single period isn't wrapped in a list
+            if not isinstance(periods, list):
+                periods = [periods]
+
+            for period in periods:
+                busy_type = period.params.get('FBTYPE', 'BUSY').upper()
+                if busy_type == 'FREE':
+                    continue
+
+                # A period either has an end or a duration
+                period_start, period_end = period.dt
+                if isinstance(period_end, timedelta):
+                    period_end = period_start + period_end
+
+                events.append(
+                    schemas.Event(
+                        title='',
+                        start=period_start,
+                        end=period_end,
+                        tentative=busy_type == 'BUSY-TENTATIVE',
+                    )
+                )
+
+        self.put_cached_events(cache_scope, events)
+
+        return events
+
+    def list_events_instead_of_freebusy(self, start, end):
+        """remember that the server doesn't support free-busy queries and list its events instead"""
+        with _caldav_lock:
+            # Only remember it for our client if it's still the pooled one
+            if _caldav_clients.get(self.client_key, (None, None))[1] is self.client:
+                _caldav_freebusy_unsupported.add(self.client_key)
+
+        return self.list_events(start, end)
+
     def create_event(
         self, event: schemas.Event, attendee: schemas.AttendeeBase, organizer: schemas.Subscriber, organizer_email: str
     ):
         """add a new event to the connected calendar"""
         calendar = self.client.calendar(url=self.url)
-        # save event
-        caldav_event = calendar.save_event(
-            uid=event.uuid,
-            dtstart=event.start,
-            dtend=event.end,
-            summary=event.title,
-            # TODO: handle location
-            description=event.description,
-        )
-        # save attendee data
-        caldav_event.add_attendee((organizer.name, organizer_email))
-        caldav_event.add_attendee((attendee.name, attendee.email))
-        caldav_event.save()
+        try:
+            # save event
+            caldav_event = calendar.save_event(
+                uid=event.uuid,
+                dtstart=event.start,
+                dtend=event.end,
+                summary=event.title,
+                # TODO: handle location
+                description=event.description,
+            )
+            # save attendee data
+            caldav_event.add_attendee((organizer.name, organizer_email))
+            caldav_event.add_attendee((attendee.name, attendee.email))
+            caldav_event.save()
+        except (caldav.lib.error.DAVError, requests.exceptions.RequestException):
+            self.reset_client()
+            raise
 
         self.bust_cached_events()
 
         return event
 
     def delete_events(self, start):
-        """delete all events in given date range from the server
+        """delete all events starting on the given day (YYYY-MM-DD) from the server
         Not intended to be used in production. For cleaning purposes after testing only.
         """
         calendar = self.client.calendar(url=self.url)
-        result = calendar.events()
+        day_start = utils.parse_date(start)
         count = 0
-        for e in result:
-            if str(e.vobject_instance.vevent.dtstart.value).startswith(start):
-                e.delete()
-                count += 1
+        try:
+            # Only fetch the events around the day instead of the whole calendar. The window is padded by a day on
+            # each side, as it's searched in server time while events start on the day in their own timezone.
+            result = calendar.search(
+                start=day_start - timedelta(days=1), end=day_start + timedelta(days=2), event=True, expand=False
+            )
+            # The server also returns events of neighbouring days, or overlapping and recurring ones, so check the start
+            for e in result:
+                event_start = e.icalendar_component['dtstart'].dt
+                # Whole day events start on a date, everything else on a datetime
+                if isinstance(event_start, datetime):
+                    event_start = event_start.date()
+
+                if event_start == day_start.date():
+                    e.delete()
+                    count += 1
+        except (caldav.lib.error.DAVError, requests.exceptions.RequestException):
+            self.reset_client()
+            raise
 
         self.bust_cached_events()
 
@@ -616,6 +814,7 @@ class Tools:
     ) -> list[schemas.Event]:
         """This helper retrieves all events existing in given calendars for the scheduled date range"""
         existing_events = []
+        connectors = []
 
         # handle calendar events
         for calendar in calendars:
@@ -646,23 +845,32 @@ class Tools:
                     calendar_id=calendar.id,
                 )
 
-            now = datetime.now()
+            connectors.append(con)
 
-            earliest_booking = now + timedelta(minutes=schedule.earliest_booking)
-            farthest_booking = now + timedelta(minutes=schedule.farthest_booking)
+        now = datetime.now()
 
-            start = max([datetime.combine(schedule.start_date, schedule.start_time), earliest_booking])
-            end = (
-                min([datetime.combine(schedule.end_date, schedule.end_time), farthest_booking])
-                if schedule.end_date
-                else farthest_booking
-            )
+        earliest_booking = now + timedelta(minutes=schedule.earliest_booking)
+        farthest_booking = now + timedelta(minutes=schedule.farthest_booking)
+
+        start = max([datetime.combine(schedule.start_date, schedule.start_time), earliest_booking])
+        end = (
+            min([datetime.combine(schedule.end_date, schedule.end_time), farthest_booking])
+            if schedule.end_date
+            else farthest_booking
+        )
 
+        def list_busy_times(connector: BaseConnector):
             try:
-                existing_events.extend(con.list_events(start.strftime(DATEFMT), end.strftime(DATEFMT)))
+                return connector.list_freebusy(start.strftime(DATEFMT), end.strftime(DATEFMT))
             except requests.exceptions.ConnectionError:
                 # Connection error with remote caldav calendar, don't crash this route.
-                pass
+                return []
+
+        # Remote calendars are queried at the same time, so we only wait for the slowest one instead of all of them
+        if connectors:
+            with ThreadPoolExecutor(max_workers=len(connectors)) as executor:
+                for events in executor.map(list_busy_times, connectors):
+                    existing_events.extend(events)
 
         # handle already requested time slots
         for slot in schedule.slots:
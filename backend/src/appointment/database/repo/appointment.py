@@ -3,7 +3,7 @@
 Repository providing CRUD functions for appointment database models.
 """
 
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, contains_eager
 from .. import models, schemas, repo
 
 
@@ -34,7 +34,14 @@ def get_public(db: Session, slug: str):
 
 def get_by_subscriber(db: Session, subscriber_id: int):
     """retrieve list of appointments by owner id"""
-    return db.query(models.Appointment).join(models.Calendar).filter(models.Calendar.owner_id == subscriber_id).all()
+    # We already join the calendar, so populate it too instead of lazy loading it per appointment
+    return (
+        db.query(models.Appointment)
+        .join(models.Calendar)
+        .options(contains_eager(models.Appointment.calendar))
+        .filter(models.Calendar.owner_id == subscriber_id)
+        .all()
+    )
 
 
 def is_owned(db: Session, appointment_id: int, subscriber_id: int):
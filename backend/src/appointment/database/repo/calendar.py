@@ -6,6 +6,7 @@ Repository providing CRUD functions for calendar database models.
 from datetime import datetime
 
 from fastapi import HTTPException
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from .. import models, schemas, repo
 
@@ -16,13 +17,10 @@ def exists(db: Session, calendar_id: int):
 
 
 def is_owned(db: Session, calendar_id: int, subscriber_id: int):
-    """check if calendar belongs to subscriber"""
-    return (
-        db.query(models.Calendar)
-        .filter(models.Calendar.id == calendar_id, models.Calendar.owner_id == subscriber_id)
-        .first()
-        is not None
-    )
+    """check if calendar belongs to subscriber
+    This goes through the session's identity map, so following an exists/get check it won't query again."""
+    db_calendar = get(db, calendar_id)
+    return db_calendar is not None and db_calendar.owner_id == subscriber_id
 
 
 def get(db: Session, calendar_id: int):
@@ -50,6 +48,19 @@ def get_by_subscriber(db: Session, subscriber_id: int, include_unconnected: bool
     return query.all()
 
 
+def get_overviews_by_subscriber(db: Session, subscriber_id: int, include_unconnected: bool = True):
+    """retrieve id, title, color and connection status of calendars by owner id
+    Skips loading full models, so we don't decrypt the connection details (url, user, password) of each calendar."""
+    query = select(models.Calendar.id, models.Calendar.title, models.Calendar.color, models.Calendar.connected).where(
+        models.Calendar.owner_id == subscriber_id
+    )
+
+    if not include_unconnected:
+        query = query.where(models.Calendar.connected == 1)
+
+    return db.execute(query).mappings().all()
+
+
 def create(db: Session, calendar: schemas.CalendarConnection, subscriber_id: int):
     """create new calendar for owner, if not already existing"""
     db_calendar = models.Calendar(**calendar.dict(), owner_id=subscriber_id)
@@ -1,5 +1,6 @@
 import datetime
 import os
+from functools import lru_cache
 from typing import Annotated
 
 import sentry_sdk
@@ -17,9 +18,19 @@ from ..exceptions.validation import InvalidTokenException, InvalidPermissionLeve
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl='token', auto_error=False)
 
 
+@lru_cache(maxsize=4096)
+def decode_token(token: str, secret: str, algorithm: str) -> dict:
+    """Verify and decode a token, a client sends the same token with every request so we only do this once.
+    Expiry isn't checked here, as a cached result would outlive the token. Callers must check it!"""
+    return jwt.decode(token, secret, algorithms=[algorithm], options={'verify_exp': False})
+
+
 def get_user_from_token(db, token: str, require_jti = False):
     try:
-        payload = jwt.decode(token, os.getenv('JWT_SECRET'), algorithms=[os.getenv('JWT_ALGO')])
+        payload = decode_token(token, os.getenv('JWT_SECRET'), os.getenv('JWT_ALGO'))
+        exp = payload.get('exp')
+        if exp is not None and int(exp) <= datetime.datetime.now(datetime.UTC).timestamp():
+            raise InvalidTokenException()
         sub = payload.get('sub')
         iat = payload.get('iat')
         jti = payload.get('jti')
@@ -1,6 +1,7 @@
 import logging
 import os
 import time
+from functools import cache
 from typing import Optional
 
 import sentry_sdk.metrics
@@ -14,13 +15,29 @@ from sqlalchemy.orm import sessionmaker
 _redis_instance : Optional[RedisCluster] = None
 
 def get_engine_and_session():
-    database_url = os.getenv('DATABASE_URL')
+    """Retrieve the engine and session factory for our database.
+    These are shared, so requests check out connections from one pool instead of building a new engine each time."""
+    return _create_engine_and_session(os.getenv('DATABASE_URL'))
+
+
+@cache
+def _create_engine_and_session(database_url: str):
     connect_args = {}
+    pool_args = {}
 
     if 'sqlite://' in database_url:
         connect_args = {'check_same_thread': False}
-
-    engine = create_engine(database_url, connect_args=connect_args)
+    else:
+        # MySQL closes idle connections after its wait_timeout, so check and recycle them before they go stale.
+        # The pool is sized to the threadpool our sync routes run on (40 threads), so handlers don't wait on checkouts.
+        pool_args = {
+            'pool_pre_ping': True,
+            'pool_recycle': int(os.getenv('DATABASE_POOL_RECYCLE_SECONDS', 1800)),
+            'pool_size': int(os.getenv('DATABASE_POOL_SIZE', 20)),
+            'max_overflow': int(os.getenv('DATABASE_POOL_MAX_OVERFLOW', 20)),
+        }
+
+    engine = create_engine(database_url, connect_args=connect_args, **pool_args)
     session_local = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
     return engine, session_local
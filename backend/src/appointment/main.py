@@ -31,6 +31,8 @@ import sys
 import typer
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
 from fastapi.exception_handlers import (
     http_exception_handler,
 )
@@ -129,6 +131,7 @@ def server():
     from .routes import zoom
     from .routes import waiting_list
     from .routes import webhooks
+    from .controller.calendar import close_caldav_clients
 
     # Hide openapi url (which will also hide docs/redoc) if we're not dev
     openapi_url = '/openapi.json' if os.getenv('APP_ENV') == APP_ENV_DEV else None
@@ -139,9 +142,11 @@ def server():
         boot_redis_cluster()
         yield
         close_redis_cluster()
+        # Close any pooled caldav sessions
+        close_caldav_clients()
 
-    # init app
-    app = FastAPI(openapi_url=openapi_url, lifespan=lifespan)
+    # init app, orjson is quite a bit faster at encoding our (often list heavy) responses than the stdlib json
+    app = FastAPI(openapi_url=openapi_url, lifespan=lifespan, default_response_class=ORJSONResponse)
 
     @app.middleware("http")
     async def apply_x_forwarded_headers_to_client(request: Request, call_next):
@@ -184,10 +189,14 @@ def server():
             'https://www.googleapis.com/auth/calendar',
         ],
         allow_credentials=True,
-        allow_methods=['*'],
-        allow_headers=['*'],
+        allow_methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'],
+        # Our frontend only sends auth and json, plus sentry's tracing headers
+        allow_headers=['authorization', 'content-type', 'sentry-trace', 'baggage'],
     )
 
+    # compress larger responses (e.g. event and appointment lists)
+    app.add_middleware(GZipMiddleware, minimum_size=512)
+
     @app.middleware('http')
     async def warn_about_deprecated_routes(request: Request, call_next):
         """Warn about clients using deprecated routes"""
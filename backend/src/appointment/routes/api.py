@@ -88,8 +88,10 @@ def read_my_calendars(
     db: Session = Depends(get_db), subscriber: Subscriber = Depends(get_subscriber), only_connected: bool = True
 ):
     """get all calendar connections of authenticated subscriber"""
-    calendars = repo.calendar.get_by_subscriber(db, subscriber_id=subscriber.id, include_unconnected=not only_connected)
-    return [schemas.CalendarOut(id=c.id, title=c.title, color=c.color, connected=c.connected) for c in calendars]
+    calendars = repo.calendar.get_overviews_by_subscriber(
+        db, subscriber_id=subscriber.id, include_unconnected=not only_connected
+    )
+    return [schemas.CalendarOut(**c) for c in calendars]
 
 
 @router.get('/me/appointments', response_model=list[schemas.AppointmentWithCalendarOut])
@@ -1,3 +1,4 @@
+import datetime
 import json
 import re
 import urllib.parse
@@ -26,6 +27,12 @@ def list_first(items: list, default=None):
     return next(iter(items), default)
 
 
+def parse_date(value: str) -> datetime.datetime:
+    """Parse a YYYY-MM-DD (DATEFMT) string into a datetime at midnight.
+    This is much cheaper than strptime, and is called for every remote event list."""
+    return datetime.datetime.combine(datetime.date.fromisoformat(value), datetime.time.min)
+
+
 def is_json(jsonstring: str):
     """Return true if given string is valid JSON."""
     try:
@@ -29,6 +29,20 @@ class TestGeneral:
         assert response.status_code == 200
         assert response.json() == 'Zustand in Ordnung'
 
+    def test_cors_preflight(self, with_client):
+        response = with_client.options('/me/calendars', headers={
+            'origin': os.getenv('FRONTEND_URL'),
+            'access-control-request-method': 'GET',
+            'access-control-request-headers': 'authorization, sentry-trace',
+        })
+        assert response.status_code == 200, response.text
+
+        response = with_client.options('/me/calendars', headers={
+            'origin': os.getenv('FRONTEND_URL'),
+            'access-control-request-method': 'PATCH',
+        })
+        assert response.status_code == 400, response.text
+
     def test_access_without_authentication_token(self, with_client):
         # response = client.get("/login")
         # assert response.status_code == 401
@@ -251,11 +251,11 @@ class TestSchedule:
                 pass
 
             @staticmethod
-            def list_events(self, start, end):
+            def list_freebusy(self, start, end):
                 return []
 
         monkeypatch.setattr(CalDavConnector, '__init__', MockCaldavConnector.__init__)
-        monkeypatch.setattr(CalDavConnector, 'list_events', MockCaldavConnector.list_events)
+        monkeypatch.setattr(CalDavConnector, 'list_freebusy', MockCaldavConnector.list_freebusy)
 
         start_date = date(2024, 3, 1)
         start_time = time(16)
@@ -366,7 +366,7 @@ class TestSchedule:
                 pass
 
             @staticmethod
-            def list_events(self, start, end):
+            def list_freebusy(self, start, end):
                 return [
                     schemas.Event(
                         title='A blocker!',
@@ -377,7 +377,7 @@ class TestSchedule:
                 ]
 
         monkeypatch.setattr(CalDavConnector, '__init__', MockCaldavConnector.__init__)
-        monkeypatch.setattr(CalDavConnector, 'list_events', MockCaldavConnector.list_events)
+        monkeypatch.setattr(CalDavConnector, 'list_freebusy', MockCaldavConnector.list_freebusy)
 
         subscriber = make_pro_subscriber()
         generated_calendar = make_caldav_calendar(subscriber.id, connected=True)
@@ -433,7 +433,7 @@ class TestRequestScheduleAvailability:
                 pass
 
             @staticmethod
-            def list_events(self, start, end):
+            def list_freebusy(self, start, end):
                 return []
 
             @staticmethod
@@ -441,7 +441,7 @@ class TestRequestScheduleAvailability:
                 pass
 
         monkeypatch.setattr(CalDavConnector, '__init__', MockCaldavConnector.__init__)
-        monkeypatch.setattr(CalDavConnector, 'list_events', MockCaldavConnector.list_events)
+        monkeypatch.setattr(CalDavConnector, 'list_freebusy', MockCaldavConnector.list_freebusy)
         monkeypatch.setattr(CalDavConnector, 'bust_cached_events', MockCaldavConnector.bust_cached_events)
 
     @pytest.fixture
@@ -485,7 +485,7 @@ class TestRequestScheduleAvailability:
 
         class MockCaldavConnector:
             @staticmethod
-            def list_events(self, start, end):
+            def list_freebusy(self, start, end):
                 return [
                     schemas.Event(
                         title='A blocker!',
@@ -499,8 +499,8 @@ class TestRequestScheduleAvailability:
                     ),
                 ]
 
-        # Override the fixture's list_events
-        monkeypatch.setattr(CalDavConnector, 'list_events', MockCaldavConnector.list_events)
+        # Override the fixture's list_freebusy
+        monkeypatch.setattr(CalDavConnector, 'list_freebusy', MockCaldavConnector.list_freebusy)
 
         subscriber = make_pro_subscriber()
         generated_calendar = make_caldav_calendar(subscriber.id, connected=True)
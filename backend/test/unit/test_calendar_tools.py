@@ -1,6 +1,29 @@
-from appointment.controller.calendar import Tools
+import caldav
+import pytest
+from requests.adapters import HTTPAdapter
+
+from appointment.controller.calendar import CalDavConnector, Tools, close_caldav_clients, get_caldav_client
 from appointment.database import schemas, models
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+
+
+def _make_caldav_event(uid, summary, dtstart, dtend, extra=''):
+    """Build a caldav event from raw ics data, no server required"""
+    data = '\n'.join([
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:-//Appointment Tests//EN',
+        'BEGIN:VEVENT',
+        f'UID:{uid}',
+        'DTSTAMP:20240101T000000Z',
+        f'SUMMARY:{summary}',
+        f'DTSTART{dtstart}',
+        f'DTEND{dtend}',
+        *([extra] if extra else []),
+        'END:VEVENT',
+        'END:VCALENDAR',
+    ])
+    return caldav.Event(data=data)
 
 
 class TestTools:
@@ -70,3 +93,228 @@ class TestVCreate:
         ics = Tools().create_vevent(appointment, slot, subscriber)
         assert ics
         assert ':'.join(['LOCATION', slot.meeting_link_url])
+
+
+class TestCalDavConnector:
+    @pytest.fixture(autouse=True)
+    def reset_caldav_clients(self):
+        """don't leak pooled clients between tests"""
+        yield
+        close_caldav_clients()
+
+    @pytest.fixture
+    def make_caldav_connector(self, monkeypatch):
+        """connect to a fake CalDAV server, whose calendar is the given mock"""
+        def _make_caldav_connector(mock_calendar):
+            con = CalDavConnector(
+                subscriber_id=1, calendar_id=1, redis_instance=None,
+                url='https://caldav.example.org/dav/', user='caldav-test', password='hunter2'
+            )
+            monkeypatch.setattr(con.client, 'calendar', lambda **kwargs: mock_calendar)
+            return con
+
+        return _make_caldav_connector
+
+    def test_client_is_pooled(self):
+        calendar = dict(url='https://caldav.example.org/dav/', user='pool-test', password='hunter2')
+
+        con = CalDavConnector(subscriber_id=1, calendar_id=1, redis_instance=None, **calendar)
+        con_again = CalDavConnector(subscriber_id=1, calendar_id=2, redis_instance=None, **calendar)
+        assert con.client is con_again.client
+        adapter = con.client.session.get_adapter(calendar['url'])
+        assert isinstance(adapter, HTTPAdapter)
+        assert adapter.max_retries.total == 1
+
+        # New credentials should result in a new client
+        calendar['password'] = 'hunter3'
+        con_new_password = CalDavConnector(subscriber_id=1, calendar_id=1, redis_instance=None, **calendar)
+        assert con_new_password.client is not con.client
+
+        # And a reset should drop the client entirely
+        con_new_password.reset_client()
+        con_reset = CalDavConnector(subscriber_id=1, calendar_id=1, redis_instance=None, **calendar)
+        assert con_reset.client is not con_new_password.client
+
+        # Urls with or without a trailing slash share a client
+        con_no_slash = CalDavConnector(
+            subscriber_id=1, calendar_id=1, redis_instance=None, **{**calendar, 'url': calendar['url'].rstrip('/')}
+        )
+        assert con_no_slash.client is con_reset.client
+
+    def test_client_pool_is_bounded(self, monkeypatch):
+        urls = [f'https://caldav.example.org/dav/{i}/' for i in range(3)]
+        first = get_caldav_client(urls[0], 'pool-test', 'hunter2', max_clients=2)
+        second = get_caldav_client(urls[1], 'pool-test', 'hunter2', max_clients=2)
+        closed = []
+        monkeypatch.setattr(second, 'close', lambda: closed.append(second))
+
+        # Using the first client again makes the second one the least recently used, so it's dropped and closed
+        assert get_caldav_client(urls[0], 'pool-test', 'hunter2', max_clients=2) is first
+        get_caldav_client(urls[2], 'pool-test', 'hunter2', max_clients=2)
+        assert closed == [second]
+
+        assert get_caldav_client(urls[0], 'pool-test', 'hunter2', max_clients=2) is first
+        assert get_caldav_client(urls[1], 'pool-test', 'hunter2', max_clients=2) is not second
+
+    def test_list_events(self, make_caldav_connector):
+        remote_events = [
+            _make_caldav_event('1', 'Meeting', ':20240105T100000Z', ':20240105T110000Z', 'DESCRIPTION:Agenda'),
+            _make_caldav_event('2', 'Holiday', ';VALUE=DATE:20240106', ';VALUE=DATE:20240107', 'STATUS:TENTATIVE'),
+            _make_caldav_event('3', 'Cancelled', ':20240105T120000Z', ':20240105T130000Z', 'STATUS:CANCELLED'),
+            _make_caldav_event('4', 'Free', ':20240105T140000Z', ':20240105T150000Z', 'TRANSP:TRANSPARENT'),
+        ]
+
+        class MockCalendar:
+            def search(self, **kwargs):
+                return remote_events
+
+        con = make_caldav_connector(MockCalendar())
+
+        events = con.list_events('2024-01-01', '2024-01-31')
+
+        assert len(events) == 2
+        assert events[0].title == 'Meeting'
+        assert events[0].description == 'Agenda'
+        assert events[0].end - events[0].start == timedelta(hours=1)
+        assert not events[0].all_day
+        assert events[1].title == 'Holiday'
+        assert events[1].start.date() == date(2024, 1, 6)
+        assert events[1].all_day
+        assert events[1].tentative
+
+    def test_list_freebusy(self, make_caldav_connector):
+        freebusy = caldav.FreeBusy(caldav.Calendar(), data='\n'.join([
+            'BEGIN:VCALENDAR',
+            'VERSION:2.0',
+            'PRODID:-//Appointment Tests//EN',
+            'BEGIN:VFREEBUSY',
+            'DTSTAMP:20240101T000000Z',
+            'FREEBUSY:20240105T100000Z/20240105T110000Z,20240105T120000Z/PT30M',
+            'FREEBUSY;FBTYPE=BUSY-TENTATIVE:20240106T100000Z/20240106T110000Z',
+            'FREEBUSY;FBTYPE=FREE:20240107T100000Z/20240107T110000Z',
+            'END:VFREEBUSY',
+            'END:VCALENDAR',
+        ]))
+
+        class MockCalendar:
+            def freebusy_request(self, start, end):
+                return freebusy
+
+        con = make_caldav_connector(MockCalendar())
+
+        events = con.list_freebusy('2024-01-01', '2024-01-31')
+
+        assert len(events) == 3
+        assert events[0].end - events[0].start == timedelta(hours=1)
+        assert events[1].end - events[1].start == timedelta(minutes=30)
+        assert not events[1].tentative
+        assert events[2].tentative
+
+    def test_list_freebusy_fallback(self, make_caldav_connector):
+        class MockCalendar:
+            def freebusy_request(self, start, end):
+                raise caldav.lib.error.ReportError()
+
+            def search(self, **kwargs):
+                return [_make_caldav_event('1', 'Meeting', ':20240105T100000Z', ':20240105T110000Z')]
+
+        con = make_caldav_connector(MockCalendar())
+
+        events = con.list_freebusy('2024-01-01', '2024-01-31')
+
+        assert len(events) == 1
+        assert events[0].title == 'Meeting'
+
+    @pytest.mark.parametrize('unsupported', [
+        caldav.lib.error.AuthorizationError(),
+        caldav.lib.error.NotFoundError(),
+        caldav.FreeBusy(caldav.Calendar(), data='<html>Not here</html>'),
+    ])
+    def test_list_freebusy_unsupported(self, make_caldav_connector, unsupported):
+        freebusy_requests = []
+
+        class MockCalendar:
+            def freebusy_request(self, start, end):
+                freebusy_requests.append((start, end))
+                if isinstance(unsupported, Exception):
+                    raise unsupported
+                return unsupported
+
+            def search(self, **kwargs):
+                return [_make_caldav_event('1', 'Meeting', ':20240105T100000Z', ':20240105T110000Z')]
+
+        con = make_caldav_connector(MockCalendar())
+
+        events = con.list_freebusy('2024-01-01', '2024-01-31')
+
+        assert len(events) == 1
+        assert events[0].title == 'Meeting'
+
+        # We remember the server doesn't support them and go straight to listing events
+        events = con.list_freebusy('2024-02-01', '2024-02-29')
+
+        assert len(events) == 1
+        assert len(freebusy_requests) == 1
+
+    def test_delete_events(self, monkeypatch, make_caldav_connector):
+        remote_events = [
+            _make_caldav_event('1', 'Meeting', ':20240105T100000Z', ':20240105T110000Z'),
+            _make_caldav_event('2', 'Overnight', ':20240104T220000Z', ':20240105T020000Z'),
+            _make_caldav_event('3', 'Holiday', ';VALUE=DATE:20240105', ';VALUE=DATE:20240106'),
+            # Starts on the 5th in its own timezone, but on the 6th in UTC
+            _make_caldav_event(
+                '4', 'Evening', ';TZID=America/New_York:20240105T210000', ';TZID=America/New_York:20240105T220000'
+            ),
+            _make_caldav_event('5', 'Tomorrow', ':20240106T100000Z', ':20240106T110000Z'),
+        ]
+        deleted = []
+        search_args = {}
+
+        class MockCalendar:
+            def search(self, **kwargs):
+                search_args.update(kwargs)
+                return remote_events
+
+        for remote_event in remote_events:
+            monkeypatch.setattr(remote_event, 'delete', lambda e=remote_event: deleted.append(e))
+
+        con = make_caldav_connector(MockCalendar())
+
+        assert con.delete_events('2024-01-05') == 3
+        assert deleted == [remote_events[0], remote_events[2], remote_events[3]]
+        assert search_args['start'] == datetime(2024, 1, 4)
+        assert search_args['end'] == datetime(2024, 1, 7)
+
+    def test_list_calendars_is_cached(self, monkeypatch):
+        discoveries = []
+
+        class MockPrincipal:
+            def calendars(self):
+                discoveries.append(True)
+                return [caldav.Calendar(url='https://caldav.example.org/dav/calendars/work/', name='Work')]
+
+        calendar = dict(url='https://caldav.example.org/dav/', user='list-test', password='hunter2')
+        con = CalDavConnector(subscriber_id=1, calendar_id=1, redis_instance=None, **calendar)
+        monkeypatch.setattr(con.client, 'principal', lambda: MockPrincipal())
+
+        assert con.list_calendars()[0].title == 'Work'
+        assert con.list_calendars()[0].title == 'Work'
+        assert len(discoveries) == 1
+
+        # An expired list or a sync should discover them again
+        con.list_calendars(expiry=0)
+        assert len(discoveries) == 2
+        con.sync_calendars()
+        con.list_calendars()
+        assert len(discoveries) == 3
+
+        # Other credentials shouldn't be served the cached list
+        calendar['password'] = 'hunter3'
+        other_con = CalDavConnector(subscriber_id=2, calendar_id=2, redis_instance=None, **calendar)
+        monkeypatch.setattr(other_con.client, 'principal', lambda: MockPrincipal())
+        other_con.list_calendars()
+        assert len(discoveries) == 4
+
+        # And the connector with the replaced client shouldn't be served the other credentials' list either
+        con.list_calendars()
+        assert len(discoveries) == 5
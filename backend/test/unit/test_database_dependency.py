@@ -0,0 +1,10 @@
+from appointment.dependencies.database import get_engine_and_session
+
+
+class TestDatabaseDependency:
+    def test_engine_is_shared(self):
+        engine, session = get_engine_and_session()
+        engine_again, session_again = get_engine_and_session()
+
+        assert engine is engine_again
+        assert session is session_again
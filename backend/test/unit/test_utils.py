@@ -1,5 +1,8 @@
+import datetime
+
 import pytest
-from appointment.utils import retrieve_user_url_data
+from appointment.defines import DATEFMT
+from appointment.utils import parse_date, retrieve_user_url_data
 
 
 class TestRetrieveUserUrlData:
@@ -51,3 +54,12 @@ class TestRetrieveUserUrlData:
         assert original_username != username
         assert original_signature != signature
         assert original_clean_url != clean_url
+
+
+class TestParseDate:
+    def test_matches_strptime(self):
+        assert parse_date('2024-02-29') == datetime.datetime.strptime('2024-02-29', DATEFMT)
+
+    def test_invalid_date(self):
+        with pytest.raises(ValueError):
+            parse_date('2023-02-29')